@@ -1,8 +1,43 @@
 """
 Setup Check Script - Prüft ob alle Dependencies installiert sind
 """
+import importlib.metadata
+import importlib.util
+import os
 import sys
 
+# --verbose actually imports each dependency; by default we only locate them
+VERBOSE = "--verbose" in sys.argv[1:]
+
+
+def check_dependency(display_name, module_name, dist_name):
+    """Prüft ein Paket über find_spec, ohne es zu importieren"""
+    print("\n" + "-" * 60)
+    print(f"Checking {display_name}...")
+    spec = importlib.util.find_spec(module_name)
+    if spec is None:
+        print(f"✗ {display_name} is NOT installed!")
+        print("\n  To install, run:")
+        print(f"    {sys.executable} -m pip install {dist_name}")
+        sys.exit(1)
+
+    print(f"✓ {display_name} is installed")
+    try:
+        print(f"  Version: {importlib.metadata.version(dist_name)}")
+    except importlib.metadata.PackageNotFoundError:
+        print("  Version: unknown")
+    print(f"  Location: {spec.origin}")
+
+    if VERBOSE:
+        try:
+            importlib.import_module(module_name)
+            print("  Import: OK")
+        except ImportError as e:
+            print(f"✗ {display_name} is installed but cannot be imported!")
+            print(f"  Error: {e}")
+            sys.exit(1)
+
+
 print("=" * 60)
 print("TCG Card Layer Generator - Setup Check")
 print("=" * 60)
@@ -11,45 +46,23 @@ print(f"Python Executable: {sys.executable}")
 print(f"Python Path: {sys.executable}")
 
 # Check PIL/Pillow
-print("\n" + "-" * 60)
-print("Checking PIL/Pillow...")
-try:
-    from PIL import Image, ImageOps, ImageFilter
-    print("✓ PIL/Pillow is installed")
-    print(f"  Version: {Image.__version__}")
-    print(f"  Location: {Image.__file__}")
-except ImportError as e:
-    print("✗ PIL/Pillow is NOT installed!")
-    print(f"  Error: {e}")
-    print("\n  To install, run:")
-    print(f"    {sys.executable} -m pip install Pillow")
-    sys.exit(1)
+check_dependency("PIL/Pillow", "PIL", "Pillow")
 
 # Check NumPy
-print("\n" + "-" * 60)
-print("Checking NumPy...")
-try:
-    import numpy as np
-    print("✓ NumPy is installed")
-    print(f"  Version: {np.__version__}")
-    print(f"  Location: {np.__file__}")
-except ImportError as e:
-    print("✗ NumPy is NOT installed!")
-    print(f"  Error: {e}")
-    print("\n  To install, run:")
-    print(f"    {sys.executable} -m pip install numpy")
-    sys.exit(1)
+check_dependency("NumPy", "numpy", "numpy")
 
 # Check project files
 print("\n" + "-" * 60)
 print("Checking project files...")
-import os
 
 files_to_check = [
+    "src/__init__.py",
     "src/config.py",
     "src/colors.py",
     "src/layers.py",
-    "src/main.py",
+    "src/detection.py",
+    "src/backside_generator.py",
+    "src/front_generator.py",
 ]
 
 all_ok = True
@@ -64,26 +77,42 @@ if not all_ok:
     print("\n⚠ Some project files are missing!")
     sys.exit(1)
 
-# Try importing project modules
+# Check that project modules are importable as the "src" package
+# (find_spec locates them without executing the module bodies)
 print("\n" + "-" * 60)
-print("Testing project imports...")
-try:
-    sys.path.insert(0, "src")
-    from config import INPUT_IMAGE
-    print("✓ Config imported successfully")
-    from colors import POKEMON_COLORS
-    print("✓ Colors imported successfully")
-    from layers import prepare_canvas
-    print("✓ Layers imported successfully")
-except ImportError as e:
-    print(f"✗ Project import failed: {e}")
-    sys.exit(1)
+print("Checking project modules...")
+modules_to_check = [
+    "src.config",
+    "src.colors",
+    "src.layers",
+    "src.detection",
+    "src.backside_generator",
+    "src.front_generator",
+]
+for module in modules_to_check:
+    try:
+        found = importlib.util.find_spec(module) is not None
+    except ImportError:
+        found = False
+    if found:
+        print(f"✓ {module}")
+    else:
+        print(f"✗ {module} - NOT IMPORTABLE (run this script from the project root)")
+        sys.exit(1)
+
+if VERBOSE:
+    try:
+        importlib.import_module("src.layers")
+        importlib.import_module("src.detection")
+        print("✓ Project modules imported successfully")
+    except ImportError as e:
+        print(f"✗ Project import failed: {e}")
+        sys.exit(1)
 
 print("\n" + "=" * 60)
 print("✔ All checks passed! Setup is correct.")
 print("=" * 60)
 print("\nYou can now run the generator with:")
-print("  python src\\main.py")
+print("  python -m src.backside_generator")
 print("\nOr with a specific theme:")
-print("  python src\\main.py fire")
-
+print("  python -m src.backside_generator fire")
@@ -0,0 +1,10 @@
+"""
+Root-level entry point for the backside generator.
+
+Equivalent to 'python -m src.backside_generator'; all arguments are passed through.
+"""
+
+import runpy
+
+if __name__ == "__main__":
+    runpy.run_module("src.backside_generator", run_name="__main__", alter_sys=True)
@@ -4,34 +4,59 @@ TCG Card Backside Generator - Generates all variants (normal, shiny, holo, rainb
 Generates professional print layers for trading card backsides with full variant support.
 """
 
-import os
 import sys
-from PIL import Image, ImageOps
 
-# Add src directory to path for imports
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+if __package__ in (None, ""):
+    # Started as a script (python src/backside_generator.py): the relative imports
+    # below need the src package, so point at the supported invocations
+    sys.exit("Run this generator from the project root with "
+             "'python -m src.backside_generator' or 'python generate_backside.py'.")
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from PIL import Image
 
-from config import (
+from .config import (
     CARD_WIDTH_MM,
     CARD_HEIGHT_MM,
     DPI,
     WHITE_THRESHOLD,
     FOIL_THRESHOLD,
     SPOT_UV_EDGE_SIZE,
+    PREVIEW_COMPRESS_LEVEL,
+    MASK_COMPRESS_LEVEL,
+    LAYER_COMPRESS_LEVEL,
     INPUT_IMAGE,
     OUTPUT_LAYER_DIR,
     OUTPUT_PREVIEW_DIR,
+    CANVAS_CACHE_DIR,
 )
-from colors import POKEMON_COLORS, get_color, get_shiny_color, RAINBOW_COLORS
-from layers import (
-    prepare_canvas,
+from .colors import POKEMON_COLORS, get_color, get_shiny_color_cached, RAINBOW_COLORS
+from .layers import (
+    load_gray_canvas,
     generate_main_layer,
-    generate_mask,
-    generate_spot_uv,
+    generate_mask_layers,
     generate_rainbow_layer,
     generate_holo_layer,
+    save_layers,
 )
 
+# Variants that can be requested individually ("all" generates every one)
+VARIANTS = ["normal", "shiny", "holo", "rainbow"]
+
+
+# Directories already created during this run (we only ever create, never delete)
+_known_dirs: set = set()
+
+
+def _ensure_dir(path: str):
+    """Create a directory once per run, skipping repeat makedirs calls."""
+    if path in _known_dirs:
+        return
+    os.makedirs(path, exist_ok=True)
+    _known_dirs.add(path)
+
 
 def create_output_directories(theme: str = None):
     """Ensure all output directories exist.
@@ -42,11 +67,21 @@ def create_output_directories(theme: str = None):
     if theme:
         theme_layer_dir = os.path.join(OUTPUT_LAYER_DIR, theme)
         theme_preview_dir = os.path.join(OUTPUT_PREVIEW_DIR, theme)
-        os.makedirs(theme_layer_dir, exist_ok=True)
-        os.makedirs(theme_preview_dir, exist_ok=True)
+        _ensure_dir(theme_layer_dir)
+        _ensure_dir(theme_preview_dir)
     else:
-        os.makedirs(OUTPUT_LAYER_DIR, exist_ok=True)
-        os.makedirs(OUTPUT_PREVIEW_DIR, exist_ok=True)
+        _ensure_dir(OUTPUT_LAYER_DIR)
+        _ensure_dir(OUTPUT_PREVIEW_DIR)
+
+
+def _tint_mask(mask: Image.Image, color: tuple) -> Image.Image:
+    """Render a mask as RGB: black where unset (0), `color` where set."""
+    # One point() table per distinct channel value (white needs only one)
+    bands = {}
+    for value in color:
+        if value not in bands:
+            bands[value] = mask.point(bytes([0] + [value] * 255))
+    return Image.merge("RGB", [bands[value] for value in color])
 
 
 def generate_preview(main_layer, white_layer, foil_layer, spot_layer, card_width, card_height):
@@ -69,33 +104,32 @@ def generate_preview(main_layer, white_layer, foil_layer, spot_layer, card_width
     # Top-left: Main color layer
     preview.paste(main_layer, (0, 0))
     
-    # Top-right: White layer (colorized)
-    # Convert grayscale to RGB by mapping black->black, white->white
-    white_preview = ImageOps.colorize(white_layer, black=(0, 0, 0), white=(255, 255, 255))
-    preview.paste(white_preview, (card_width, 0))
+    # Masks are tinted with per-band point() tables and merged, all in PIL's
+    # C loops; paste then copies each quadrant row by row
+    # Top-right: White layer (white)
+    preview.paste(_tint_mask(white_layer, (255, 255, 255)), (card_width, 0))
     
     # Bottom-left: Foil layer (colorized in gold)
-    # Map black->black, white->gold (RGB: 255, 215, 0)
-    foil_preview = ImageOps.colorize(foil_layer, black=(0, 0, 0), white=(255, 215, 0))
-    preview.paste(foil_preview, (0, card_height))
+    preview.paste(_tint_mask(foil_layer, (255, 215, 0)), (0, card_height))
     
     # Bottom-right: Spot UV layer (colorized in cyan)
-    # Map black->black, white->cyan (RGB: 0, 255, 255)
-    spot_preview = ImageOps.colorize(spot_layer, black=(0, 0, 0), white=(0, 255, 255))
-    preview.paste(spot_preview, (card_width, card_height))
+    preview.paste(_tint_mask(spot_layer, (0, 255, 255)), (card_width, card_height))
     
     return preview
 
 
-def generate_theme_layers(theme: str, gray_img: Image.Image, img_size: tuple, variant: str = "normal") -> bool:
+def generate_theme_layers(theme: str, gray_img, img_size: tuple, variant: str = "normal",
+                          masks: tuple = None) -> bool:
     """
     Generate layers for a specific theme and variant.
     
     Args:
         theme: Color theme name
-        gray_img: Pre-processed grayscale image
+        gray_img: Pre-processed grayscale image or its uint8 pixel array
         img_size: Tuple of (width, height) in pixels
         variant: Variant type - "normal", "shiny", "holo", or "rainbow"
+        masks: Optional precomputed (white, foil, spot) layers from
+               layers.generate_mask_layers; computed here if omitted
         
     Returns:
         True if successful, False otherwise
@@ -125,30 +159,25 @@ def generate_theme_layers(theme: str, gray_img: Image.Image, img_size: tuple, va
     if variant == "rainbow":
         main_layer = generate_rainbow_layer(gray_img, RAINBOW_COLORS)
     elif variant == "shiny":
-        shiny_color = get_shiny_color(base_color)
+        shiny_color = get_shiny_color_cached(theme)
         main_layer = generate_main_layer(gray_img, shiny_color)
     elif variant == "holo":
         main_layer = generate_holo_layer(gray_img, base_color)
     else:  # normal
         main_layer = generate_main_layer(gray_img, base_color)
     
-    # Generate other layers (same for all variants)
-    white_layer = generate_mask(gray_img, WHITE_THRESHOLD)
-    foil_layer = generate_mask(gray_img, FOIL_THRESHOLD)
-    spot_layer = generate_spot_uv(gray_img, SPOT_UV_EDGE_SIZE)
+    # Other layers are the same for all themes and variants
+    if masks is None:
+        masks = generate_mask_layers(gray_img, WHITE_THRESHOLD, FOIL_THRESHOLD, SPOT_UV_EDGE_SIZE)
+    white_layer, foil_layer, spot_layer = masks
     
-    # Save individual layers
+    # Output paths for individual layers
     main_path = os.path.join(theme_layer_dir, "main_color.png")
     white_path = os.path.join(theme_layer_dir, "white_layer.png")
     foil_path = os.path.join(theme_layer_dir, "foil_layer.png")
     spot_path = os.path.join(theme_layer_dir, "spot_uv_layer.png")
     
-    main_layer.save(main_path)
-    white_layer.save(white_path)
-    foil_layer.save(foil_path)
-    spot_layer.save(spot_path)
-    
-    # Generate and save preview
+    # Generate preview
     # Get dimensions from generated layer (more reliable than img_size tuple)
     card_width = main_layer.width
     card_height = main_layer.height
@@ -156,15 +185,39 @@ def generate_theme_layers(theme: str, gray_img: Image.Image, img_size: tuple, va
         main_layer, white_layer, foil_layer, spot_layer,
         card_width, card_height
     )
-    
     preview_path = os.path.join(theme_preview_dir, "layer_preview.png")
-    preview.save(preview_path)
+    
+    # Save all layers and the preview concurrently
+    save_layers([
+        (main_layer, main_path, {"compress_level": LAYER_COMPRESS_LEVEL}),
+        (white_layer, white_path, {"compress_level": MASK_COMPRESS_LEVEL}),
+        (foil_layer, foil_path, {"compress_level": MASK_COMPRESS_LEVEL}),
+        (spot_layer, spot_path, {"compress_level": MASK_COMPRESS_LEVEL}),
+        (preview, preview_path, {"compress_level": PREVIEW_COMPRESS_LEVEL}),
+    ])
     
     print(f"   ✓ {theme_name.capitalize()}: layers saved to {theme_layer_dir}/")
     return True
 
 
-def main(theme: str = "grass", batch_mode: bool = False, input_image_path: str = None, variant: str = "all"):
+# Shared inputs for worker processes, set once per worker by _init_worker
+_worker_inputs = None
+
+
+def _init_worker(gray_np, img_size: tuple, masks: tuple):
+    """Store the shared grayscale array and masks in a worker process."""
+    global _worker_inputs
+    _worker_inputs = (gray_np, img_size, masks)
+
+
+def _run_worker_job(theme: str, variant: str) -> bool:
+    """Generate one theme/variant in a worker process."""
+    gray_np, img_size, masks = _worker_inputs
+    return generate_theme_layers(theme, gray_np, img_size, variant, masks)
+
+
+def main(theme: str = "grass", batch_mode: bool = False, input_image_path: str = None, variant: str = "all",
+         jobs: int = None):
     """
     Main processing function for backside generation.
     
@@ -173,6 +226,8 @@ def main(theme: str = "grass", batch_mode: bool = False, input_image_path: str =
         batch_mode: If True, generate all themes (overrides theme parameter)
         input_image_path: Optional custom input image path
         variant: Variant type - "normal", "shiny", "holo", "rainbow", or "all" (default: "all")
+        jobs: Number of worker processes for theme/variant jobs
+              (default: number of CPUs, 1 = run serially)
     """
     print(f"🎨 TCG Card Backside Generator")
     
@@ -208,13 +263,15 @@ def main(theme: str = "grass", batch_mode: bool = False, input_image_path: str =
     
     print(f"📥 Loading: {image_to_process}")
     
-    # Load and prepare image (only once for batch mode)
+    # Load and prepare image (only once for batch mode), converted to
+    # grayscale once and shared across every theme/variant
     try:
-        img = Image.open(image_to_process).convert("RGB")
-        print(f"   Original size: {img.size[0]}x{img.size[1]} px")
+        with Image.open(image_to_process) as original:  # Reads the header only
+            print(f"   Original size: {original.size[0]}x{original.size[1]} px")
         
-        img = prepare_canvas(img, CARD_WIDTH_MM, CARD_HEIGHT_MM, DPI)
-        print(f"   Prepared size: {img.size[0]}x{img.size[1]} px ({CARD_WIDTH_MM}x{CARD_HEIGHT_MM} mm @ {DPI} DPI)")
+        gray_np = load_gray_canvas(image_to_process, CARD_WIDTH_MM, CARD_HEIGHT_MM, DPI, CANVAS_CACHE_DIR)
+        img_size = (gray_np.shape[1], gray_np.shape[0])
+        print(f"   Prepared size: {img_size[0]}x{img_size[1]} px ({CARD_WIDTH_MM}x{CARD_HEIGHT_MM} mm @ {DPI} DPI)")
         
     except Exception as e:
         print(f"❌ Error loading image: {e}")
@@ -233,55 +290,64 @@ def main(theme: str = "grass", batch_mode: bool = False, input_image_path: str =
     
     print()
     
-    # Convert to grayscale for processing (only once for batch mode)
-    gray = ImageOps.grayscale(img)
-    img_size = (img.width, img.height)
+    # The variant-independent masks are also computed once and shared
+    masks = generate_mask_layers(gray_np, WHITE_THRESHOLD, FOIL_THRESHOLD, SPOT_UV_EDGE_SIZE)
     
     print()
     print("🔧 Generating layers...")
     print()
     
+    # Build the list of independent (theme, variant) jobs
+    jobs_to_run = []
+    if variant.lower() == "rainbow":
+        # Rainbow-only mode: the rainbow layer is theme-agnostic
+        jobs_to_run.append(("", "rainbow"))
+    else:
+        for current_theme in themes_to_process:
+            for current_variant in variants_to_process:
+                jobs_to_run.append((current_theme, current_variant))
+        
+        # Add rainbow variant if "all" variants requested (once per batch, not per theme)
+        if variant.lower() == "all":
+            jobs_to_run.append(("", "rainbow"))
+    
     # Process each theme and variant combination
     successful = 0
     failed = 0
-    rainbow_generated = False
     
-    # Handle rainbow-only mode
-    if variant.lower() == "rainbow":
-        if theme.lower() not in POKEMON_COLORS or theme.lower() == "rainbow":
-            if generate_theme_layers("", gray, img_size, "rainbow"):
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    jobs = max(1, min(jobs, len(jobs_to_run)))
+    
+    if jobs == 1:
+        for current_theme, current_variant in jobs_to_run:
+            if generate_theme_layers(current_theme, gray_np, img_size, current_variant, masks):
                 successful += 1
             else:
                 failed += 1
-            rainbow_generated = True
     else:
-        for current_theme in themes_to_process:
-            if len(themes_to_process) > 1:
-                print(f"  Processing {current_theme}...")
-            
-            # Generate all variants for this theme
-            for current_variant in variants_to_process:
-                if generate_theme_layers(current_theme, gray, img_size, current_variant):
+        # Jobs are independent, so spread them over worker processes. Each
+        # worker receives the shared grayscale array and masks once.
+        print(f"   Using {jobs} parallel workers")
+        with ProcessPoolExecutor(
+            max_workers=jobs,
+            initializer=_init_worker,
+            initargs=(gray_np, img_size, masks),
+        ) as executor:
+            futures = [
+                executor.submit(_run_worker_job, current_theme, current_variant)
+                for current_theme, current_variant in jobs_to_run
+            ]
+            for future in as_completed(futures):
+                if future.result():
                     successful += 1
                 else:
                     failed += 1
-            
-            # Add rainbow variant if "all" variants requested (once per batch, not per theme)
-            if variant.lower() == "all" and not rainbow_generated:
-                if generate_theme_layers("", gray, img_size, "rainbow"):
-                    successful += 1
-                    rainbow_generated = True
-                else:
-                    failed += 1
     
     print()
     print("=" * 60)
     print(f"✔ Generation complete!")
-    total_expected = len(themes_to_process) * len(variants_to_process)
-    if variant.lower() == "all" and not rainbow_generated:
-        total_expected += 1  # Add one rainbow variant
-    if rainbow_generated and variant.lower() == "rainbow":
-        total_expected = 1
+    total_expected = len(jobs_to_run)
     print(f"   Successful: {successful}/{total_expected}")
     if failed > 0:
         print(f"   Failed: {failed}/{total_expected}")
@@ -289,82 +355,102 @@ def main(theme: str = "grass", batch_mode: bool = False, input_image_path: str =
     print("=" * 60)
 
 
-if __name__ == "__main__":
-    # Parse command line arguments
-    variant = "all"  # Default to all variants
-    image_path = None
+def parse_arguments(argv: list = None) -> argparse.Namespace:
+    """
+    Parse and validate command line arguments.
     
-    if len(sys.argv) == 1:
-        # No arguments: generate all themes, all variants with default image
-        main(theme="all", batch_mode=True, variant="all")
-    elif len(sys.argv) == 2:
-        # One argument: theme name
-        theme_arg = sys.argv[1].lower()
-        if theme_arg == "all":
-            main(theme="all", batch_mode=True, variant="all")
-        elif theme_arg in ["normal", "shiny", "holo", "rainbow"]:
-            # Variant without theme - assume "all" themes
-            main(theme="all", batch_mode=True, variant=theme_arg)
-        else:
-            main(theme=theme_arg, variant="all")
-    elif len(sys.argv) == 3:
-        # Two arguments: could be theme + variant OR theme + image
-        arg1 = sys.argv[1].lower()
-        arg2 = sys.argv[2]  # Keep original case for file paths
+    Supports the positional form ``[theme] [variant] [image_path]`` as well
+    as ``--theme``/``--variant``/``--input``/``--jobs`` options (options win).
+    Everything is validated here, before any image is opened.
+    
+    Args:
+        argv: Argument list (default: sys.argv[1:])
         
-        # Check if arg2 is a variant name (case-insensitive)
-        arg2_lower = arg2.lower()
-        if arg2_lower in ["normal", "shiny", "holo", "rainbow"]:
-            # Theme + variant
-            if arg1 == "all":
-                main(theme="all", batch_mode=True, variant=arg2_lower)
-            else:
-                main(theme=arg1, variant=arg2_lower)
-        elif os.path.exists(arg2) or arg2.lower().endswith(('.png', '.jpg', '.jpeg')):
-            # Theme + image path (use original case)
-            if arg1 == "all":
-                print("⚠️  'all' theme not supported with custom image")
-                print("   Please specify a specific theme name")
-                sys.exit(1)
-            if arg1 not in POKEMON_COLORS:
-                print(f"❌ Error: Unknown theme '{arg1}'")
-                print(f"   Available themes: {', '.join(POKEMON_COLORS.keys())}")
-                sys.exit(1)
-            main(theme=arg1, input_image_path=arg2, variant="all")
+    Returns:
+        Namespace with theme, variant, input and jobs
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m src.backside_generator",
+        description="Generate print layers for trading card backsides.",
+        epilog=(
+            "examples:\n"
+            "  python -m src.backside_generator                         # All themes, all variants\n"
+            "  python -m src.backside_generator fire                    # Theme, all variants\n"
+            "  python -m src.backside_generator fire shiny              # Theme, specific variant\n"
+            "  python -m src.backside_generator fire my_backside.png    # Theme, custom image\n"
+            "  python -m src.backside_generator --theme fire --variant holo --input my_backside.png"
+        ),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("positional", nargs="*", metavar="ARG",
+                        help="[theme] [variant] [image_path]")
+    parser.add_argument("--theme", help="Color theme name or 'all' (default: all)")
+    parser.add_argument("--variant", type=str.lower, choices=VARIANTS + ["all"],
+                        help="Variant to generate (default: all)")
+    parser.add_argument("--input", help="Custom backside image path")
+    parser.add_argument("--jobs", type=int,
+                        help="Number of worker processes (default: number of CPUs)")
+    args = parser.parse_args(argv)
+    
+    # Map the positional form onto theme/variant/input
+    theme = None
+    variant = None
+    image_path = None
+    positional = args.positional
+    if len(positional) == 1:
+        # One argument: theme name, "all", or a variant for all themes
+        if positional[0].lower() in VARIANTS:
+            variant = positional[0].lower()
         else:
-            print(f"❌ Error: Invalid argument '{arg2}'")
-            print("   Expected: variant name (normal/shiny/holo/rainbow) or image path")
-            sys.exit(1)
-    elif len(sys.argv) == 4:
+            theme = positional[0].lower()
+    elif len(positional) == 2:
+        # Two arguments: theme + variant OR theme + image
+        theme = positional[0].lower()
+        if positional[1].lower() in VARIANTS + ["all"]:
+            variant = positional[1].lower()
+        elif os.path.exists(positional[1]) or positional[1].lower().endswith(('.png', '.jpg', '.jpeg')):
+            image_path = positional[1]  # Keep original case for file paths
+        else:
+            parser.error(
+                f"invalid argument '{positional[1]}' "
+                "(expected variant name normal/shiny/holo/rainbow or image path)"
+            )
+    elif len(positional) == 3:
         # Three arguments: theme + variant + image
-        theme_arg = sys.argv[1].lower()
-        variant_arg = sys.argv[2].lower()
-        image_path = sys.argv[3]
-        
-        if theme_arg == "all":
-            print("⚠️  'all' theme not supported with custom image")
-            print("   Please specify a specific theme name")
-            sys.exit(1)
-        
-        if theme_arg not in POKEMON_COLORS:
-            print(f"❌ Error: Unknown theme '{theme_arg}'")
-            print(f"   Available themes: {', '.join(POKEMON_COLORS.keys())}")
-            sys.exit(1)
-        
-        if variant_arg not in ["normal", "shiny", "holo", "rainbow", "all"]:
-            print(f"❌ Error: Unknown variant '{variant_arg}'")
-            print("   Available variants: normal, shiny, holo, rainbow, all")
-            sys.exit(1)
-        
-        main(theme=theme_arg, input_image_path=image_path, variant=variant_arg)
-    else:
-        print("Usage:")
-        print("  python src/backside_generator.py                                    # All themes, all variants")
-        print("  python src/backside_generator.py <theme>                            # Theme, all variants")
-        print("  python src/backside_generator.py <theme> <variant>                  # Theme, specific variant")
-        print("  python src/backside_generator.py <theme> <image_path>               # Theme, all variants, custom image")
-        print("  python src/backside_generator.py <theme> <variant> <image_path>     # Theme, variant, custom image")
-        print()
-        print("Variants: normal, shiny, holo, rainbow, all (default: all)")
-        sys.exit(1)
+        theme = positional[0].lower()
+        variant = positional[1].lower()
+        image_path = positional[2]
+    elif len(positional) > 3:
+        parser.error("too many arguments")
+    
+    args.theme = (args.theme or theme or "all").lower()
+    args.variant = args.variant or variant or "all"
+    args.input = args.input or image_path
+    
+    if args.theme != "all" and args.theme not in POKEMON_COLORS:
+        parser.error(
+            f"unknown theme '{args.theme}' "
+            f"(available themes: {', '.join(POKEMON_COLORS.keys())})"
+        )
+    if args.variant not in VARIANTS + ["all"]:
+        parser.error(
+            f"unknown variant '{args.variant}' "
+            "(available variants: normal, shiny, holo, rainbow, all)"
+        )
+    if args.input and args.theme == "all":
+        parser.error("'all' theme not supported with custom image, please specify a theme name")
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    
+    return args
 
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    main(
+        theme=args.theme,
+        batch_mode=args.theme == "all",
+        input_image_path=args.input,
+        variant=args.variant,
+        jobs=args.jobs,
+    )
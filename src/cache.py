@@ -0,0 +1,59 @@
+"""
+On-disk cache helpers shared by detection and both generators.
+
+Cache entries are keyed by file content plus the settings that shape them,
+and written atomically. Writing is best effort: a failed write only costs
+a cache miss on the next run.
+"""
+
+import hashlib
+import os
+from typing import Callable
+
+
+def file_digest(path: str, settings: tuple) -> str:
+    """
+    Hash a file's content together with the settings that shape its cache entry.
+    
+    Args:
+        path: Path to the input file
+        settings: Tuple of values that invalidate the entry when changed
+        
+    Returns:
+        Hex SHA-256 digest of repr(settings) followed by the file bytes
+    """
+    digest = hashlib.sha256()
+    digest.update(repr(settings).encode())
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def atomic_write(path: str, writer: Callable) -> bool:
+    """
+    Write a cache file through a temporary file and an atomic rename.
+    
+    Readers never see a partially written file under `path`. Failures are
+    swallowed, since they only cost a cache miss.
+    
+    Args:
+        path: Destination path (parent directories are created)
+        writer: Callable receiving the open binary file object
+        
+    Returns:
+        True if the file was written, False otherwise
+    """
+    tmp_path = path + ".tmp"
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            writer(f)
+        os.replace(tmp_path, path)
+        return True
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return False
@@ -6,6 +6,8 @@ These colors are used to recolor the base artwork while preserving
 the original grayscale luminance values.
 """
 
+import numpy as np
+
 POKEMON_COLORS = {
     "grass": (78, 159, 61),
     "fire": (201, 55, 55),
@@ -20,6 +22,15 @@ POKEMON_COLORS = {
     "colorless": (210, 210, 210),
 }
 
+# Theme names and their colors as an (N, 3) array, in POKEMON_COLORS order,
+# for vectorized nearest-color matching. Computed once at import.
+_PALETTE_KEYS: tuple = tuple(POKEMON_COLORS.keys())
+_PALETTE_RGB: np.ndarray = np.asarray(list(POKEMON_COLORS.values()), dtype=np.float32)
+
+# Squared norm of every palette color, so squared distances to a query q
+# reduce to one matrix-vector product: |p|^2 - 2 p.q + |q|^2
+_PALETTE_RGB_SQNORM: np.ndarray = (_PALETTE_RGB ** 2).sum(axis=1)
+
 def get_shiny_color(base_color: tuple) -> tuple:
     """
     Generate shiny version of a color (brighter, more saturated).
@@ -38,6 +49,31 @@ def get_shiny_color(base_color: tuple) -> tuple:
     b = min(255, int(b * 1.2) + 20)
     return (r, g, b)
 
+# Shiny version of every theme color, precomputed once at import
+_SHINY_COLORS = {
+    theme: get_shiny_color(color) for theme, color in POKEMON_COLORS.items()
+}
+
+def get_shiny_color_cached(theme: str) -> tuple:
+    """
+    Get the precomputed shiny color tuple for a given theme.
+    
+    Args:
+        theme: Color theme name (e.g., "grass", "fire")
+        
+    Returns:
+        Shiny RGB tuple (R, G, B)
+        
+    Raises:
+        KeyError: If theme is not found
+    """
+    if theme not in _SHINY_COLORS:
+        available = ", ".join(POKEMON_COLORS.keys())
+        raise KeyError(
+            f"Unknown theme '{theme}'. Available themes: {available}"
+        )
+    return _SHINY_COLORS[theme]
+
 # Rainbow colors in order for gradient generation
 RAINBOW_COLORS = [
     (201, 55, 55),    # Red (fire)
@@ -31,6 +31,28 @@ FOIL_THRESHOLD = 200
 # Must be odd number >= 3 (e.g., 3, 5, 7, 9)
 SPOT_UV_EDGE_SIZE = 3
 
+# ==============================
+# DETECTION
+# ==============================
+
+# Card fronts are analyzed on a thumbnail no larger than this (pixels per side)
+# Nearest-neighbor subsampling keeps the edge statistics of the full image
+DETECTION_MAX_SIZE = 512
+
+# ==============================
+# OUTPUT ENCODING
+# ==============================
+
+# PNG zlib compression levels (0-9) for every file written
+# Lower = faster to write, larger files; pixel data is identical (lossless)
+# Previews are internal proofs, so favor speed
+PREVIEW_COMPRESS_LEVEL = 1
+# Masks are nearly binary and still compress well at a low level
+MASK_COMPRESS_LEVEL = 3
+# Main color layers: level 1 encodes ~4x faster than the default 6
+# for ~10% larger files
+LAYER_COMPRESS_LEVEL = 1
+
 # ==============================
 # FILE PATHS
 # ==============================
@@ -43,3 +65,12 @@ INPUT_FRONT_IMAGE = "input/card_front.png"  # For front generator
 OUTPUT_LAYER_DIR = "output/layers"
 OUTPUT_PREVIEW_DIR = "output/preview"
 
+# Cache for reusable results (relative to project root)
+# Detection results are keyed by image content, so stale entries are harmless
+CACHE_DIR = ".cache"
+DETECTION_CACHE_FILE = ".cache/detection.json"
+# Front-generator backside layers, keyed by base image content and settings
+BACKSIDE_CACHE_DIR = ".cache/backside"
+# Prepared grayscale canvases, keyed by input image content and card settings
+CANVAS_CACHE_DIR = ".cache/canvas"
+
@@ -5,9 +5,57 @@ Detects card variant (shiny/holo/normal) and type (grass, fire, etc.)
 based on image analysis.
 """
 
+import hashlib
+import json
+import math
+import warnings
+from functools import lru_cache
+
 import numpy as np
-from PIL import Image
-from colors import POKEMON_COLORS
+from PIL import Image, ImageStat
+from .cache import atomic_write
+from .colors import _PALETTE_KEYS, _PALETTE_RGB, _PALETTE_RGB_SQNORM
+from .config import DETECTION_CACHE_FILE
+
+# Bump when detection logic changes so cached results are not reused
+_DETECTION_CACHE_VERSION = 1
+
+
+def _rgb_to_hsv(rgb: np.ndarray) -> np.ndarray:
+    """
+    Vectorized RGB to HSV conversion with the same semantics as colorsys.rgb_to_hsv.
+    
+    Args:
+        rgb: Array of shape (..., 3) with RGB values in 0-255
+        
+    Returns:
+        Float array of shape (..., 3) with H, S, V in 0.0-1.0
+    """
+    rgb = np.asarray(rgb, dtype=np.float64) / 255.0
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    maxc = rgb.max(axis=-1)
+    minc = rgb.min(axis=-1)
+    rangec = maxc - minc
+    gray = rangec == 0
+    
+    # Avoid 0/0 for grays; their hue and saturation are forced to 0 below
+    safe_range = np.where(gray, 1.0, rangec)
+    safe_max = np.where(maxc == 0, 1.0, maxc)
+    rc = (maxc - r) / safe_range
+    gc = (maxc - g) / safe_range
+    bc = (maxc - b) / safe_range
+    
+    # Same precedence as colorsys: red wins ties, then green, then blue
+    h = np.where(r == maxc, bc - gc, np.where(g == maxc, 2.0 + rc - bc, 4.0 + gc - rc))
+    h = np.where(gray, 0.0, (h / 6.0) % 1.0)
+    s = np.where(gray, 0.0, rangec / safe_max)
+    return np.stack([h, s, maxc], axis=-1)
+
+
+# HSV of every type color (rows follow _PALETTE_KEYS), computed once at import
+_PALETTE_HSV = _rgb_to_hsv(_PALETTE_RGB)
+_METAL_INDEX = _PALETTE_KEYS.index("metal")
+_WATER_INDEX = _PALETTE_KEYS.index("water")
 
 
 def detect_variant(img: Image.Image) -> str:
@@ -27,50 +75,78 @@ def detect_variant(img: Image.Image) -> str:
         Variant string: "shiny", "holo", "rainbow", or "normal"
     """
     w, h = img.size
-    img_np = np.array(img)
     
     # Analyze edge regions (typically 5-8% of image size for border detection)
     edge_width = max(5, int(min(w, h) * 0.06))
     
-    # Extract edge regions (top, bottom, left, right)
-    top_edge = img_np[0:edge_width, :, :]
-    bottom_edge = img_np[h-edge_width:h, :, :]
-    left_edge = img_np[:, 0:edge_width, :]
-    right_edge = img_np[:, w-edge_width:w, :]
-    
-    # Combine all edges
-    edges = np.concatenate([
-        top_edge.reshape(-1, 3),
-        bottom_edge.reshape(-1, 3),
-        left_edge.reshape(-1, 3),
-        right_edge.reshape(-1, 3)
-    ], axis=0)
-    
-    # Calculate per-channel variance in edges
-    r_var = np.var(edges[:, 0])
-    g_var = np.var(edges[:, 1])
-    b_var = np.var(edges[:, 2])
-    edge_variance = (r_var + g_var + b_var) / 3.0
+    # Extract edge regions as non-overlapping strips: top and bottom span the
+    # full width, left and right exclude the corners already covered above.
+    # Cropping first means only the border pixels are converted to NumPy.
+    # Boxes are clamped to the image, so on tiny inputs the strips shrink or
+    # come back empty instead of being invalid or zero-padded.
+    top = min(edge_width, h)
+    bottom = max(h - edge_width, 0)
+    side_width = min(edge_width, w)
+    top_edge = np.asarray(img.crop((0, 0, w, top)))
+    bottom_edge = np.asarray(img.crop((0, bottom, w, h)))
+    left_edge = np.asarray(img.crop((0, top, side_width, max(top, bottom))))
+    right_edge = np.asarray(img.crop((w - side_width, top, w, max(top, bottom))))
+    
+    # Each strip is a contiguous array, so reshape(-1, 3) is a view. Statistics
+    # are accumulated strip by strip instead of concatenating a copy of all edges.
+    strips = [
+        strip.reshape(-1, 3)
+        for strip in (top_edge, bottom_edge, left_edge, right_edge)
+        if strip.size
+    ]
+    n = sum(strip.shape[0] for strip in strips)
+    
+    channel_sums = np.zeros(3, dtype=np.uint64)
+    channel_sq_sums = np.zeros(3, dtype=np.uint64)
+    saturation_total = 0.0
+    brightness_total = 0
+    brightness_sq_total = 0
+    brightness_max = 0
+    brightness_min = 3 * 255
+    
+    for strip in strips:
+        # Per-channel sums and sums of squares, straight from uint8
+        channel_sums += strip.sum(axis=0, dtype=np.uint64)
+        channel_sq_sums += np.einsum("ij,ij->j", strip, strip, dtype=np.uint64)
+        
+        # Saturation (max - min) / max, divided in place in one float32 buffer;
+        # black pixels (max 0) are skipped and keep their saturation of 0
+        max_rgb = strip.max(axis=1)
+        min_rgb = strip.min(axis=1)
+        saturation = np.subtract(max_rgb, min_rgb, dtype=np.float32)
+        np.divide(saturation, max_rgb, out=saturation, where=max_rgb > 0)
+        saturation_total += float(saturation.sum(dtype=np.float64))
+        
+        # Brightness is kept as the integer sum r + g + b (3x the mean, no float
+        # divide), so the thresholds below are scaled: x3 for contrast, x9 for variance
+        brightness_sum = strip.sum(axis=1, dtype=np.uint16)
+        brightness_total += int(brightness_sum.sum(dtype=np.uint64))
+        brightness_sq_total += int(np.einsum("i,i->", brightness_sum, brightness_sum, dtype=np.uint64))
+        brightness_max = max(brightness_max, int(brightness_sum.max()))
+        brightness_min = min(brightness_min, int(brightness_sum.min()))
+    
+    # Per-channel mean and variance from the fused integer sums. n^2 * var is
+    # n * sum(x^2) - sum(x)^2, evaluated in Python ints so it is exact (no
+    # float cancellation), with a single divide at the end
+    channel_means = channel_sums / n
+    channel_var_totals = [n * int(sq) - int(tot) ** 2 for tot, sq in zip(channel_sums, channel_sq_sums)]
+    edge_variance = sum(channel_var_totals) / (3 * n * n)
     
     # Calculate color variance across all channels (holo has high variance due to rainbow)
-    channel_means = np.mean(edges, axis=0)
     color_variance = np.var(channel_means)
     
     # Calculate saturation in edges (shiny has higher saturation)
-    max_rgb = np.max(edges, axis=1)
-    min_rgb = np.min(edges, axis=1)
-    saturation = np.where(max_rgb > 0, (max_rgb - min_rgb) / max_rgb, 0)
-    avg_saturation = np.mean(saturation)
+    avg_saturation = saturation_total / n
     
-    # Calculate brightness variance (shiny has distinct bright patterns)
-    brightness = np.mean(edges, axis=1)
-    brightness_variance = np.var(brightness)
-    brightness_std = np.std(brightness)
-    
-    # Calculate contrast (difference between max and min brightness in edges)
-    max_brightness = np.max(brightness)
-    min_brightness = np.min(brightness)
-    contrast = max_brightness - min_brightness
+    # Brightness variance (exact, from integer totals) and contrast
+    # (difference between max and min brightness in edges)
+    brightness_sum_variance = (n * brightness_sq_total - brightness_total ** 2) / (n * n)
+    contrast_sum = brightness_max - brightness_min
     
     # Detection thresholds (tuned for typical Pokémon card patterns)
     
@@ -78,7 +154,12 @@ def detect_variant(img: Image.Image) -> str:
     # Rainbow cards have very high variance everywhere, not just edges
     if edge_variance > 5000 and color_variance > 4000:
         # Additional check: rainbow often has all colors present
-        edge_colors_unique = len(np.unique(edges.reshape(-1, 3), axis=0))
+        # Count distinct colors with a bitmap over all 2^24 packed RGB values:
+        # one scatter per strip and one count, instead of sorting every pixel
+        seen = np.zeros(1 << 24, dtype=np.bool_)
+        for strip in strips:
+            seen[(strip[:, 0].astype(np.uint32) << 16) | (strip[:, 1].astype(np.uint32) << 8) | strip[:, 2]] = True
+        edge_colors_unique = int(np.count_nonzero(seen))
         if edge_colors_unique > 100:  # Many unique colors = rainbow effect
             return "rainbow"
     
@@ -89,7 +170,8 @@ def detect_variant(img: Image.Image) -> str:
     
     # Shiny: High saturation, high brightness variance/contrast (distinct border patterns)
     # Shiny cards have bright, saturated borders with high contrast
-    if (avg_saturation > 0.35 and brightness_variance > 1200) or contrast > 180:
+    # (brightness variance > 1200 or contrast > 180, in brightness-sum units)
+    if (avg_saturation > 0.35 and brightness_sum_variance > 1200 * 9) or contrast_sum > 180 * 3:
         return "shiny"
     
     # Normal: Default (low variance, consistent colors)
@@ -113,84 +195,178 @@ def detect_type(img: Image.Image) -> str:
         Type string: "grass", "fire", "water", etc.
     """
     w, h = img.size
-    img_np = np.array(img)
     
     # Crop inner region (exclude 10% edge on all sides)
     crop_margin = int(min(w, h) * 0.10)
-    inner = img_np[crop_margin:h-crop_margin, crop_margin:w-crop_margin, :]
+    inner = img.crop((crop_margin, crop_margin, w - crop_margin, h - crop_margin))
     
     # Calculate average color in inner region
-    avg_color = np.mean(inner.reshape(-1, 3), axis=0).astype(int)
-    avg_r, avg_g, avg_b = avg_color
+    # ImageStat derives the exact per-band mean from PIL's C histogram, so no
+    # pixel array is materialized
+    avg_color = tuple(int(c) for c in ImageStat.Stat(inner).mean[:3])
+    
+    return _closest_type(avg_color)
+
+
+@lru_cache(maxsize=4096)
+def _closest_type(avg_color: tuple) -> str:
+    """
+    Match an average RGB color to the closest Pokémon type color.
+    
+    The result only depends on the integer average color, so it is memoized:
+    repeated or similar cards skip the palette scan entirely. The weighted
+    HSV/RGB distance with circular hue is not a metric a k-d tree can index,
+    and with one query per card a linear scan over the palette is cheap.
+    
+    Args:
+        avg_color: Integer RGB tuple (R, G, B)
+        
+    Returns:
+        Type string: "grass", "fire", "water", etc.
+    """
+    avg_color = np.asarray(avg_color)
     
     # Convert average color to HSV for better perceptual matching
-    from colorsys import rgb_to_hsv
-    avg_h, avg_s, avg_v = rgb_to_hsv(avg_r / 255.0, avg_g / 255.0, avg_b / 255.0)
+    avg_h, avg_s, avg_v = (float(c) for c in _rgb_to_hsv(avg_color))
     
     # Special handling: If image has blue hue and some saturation, strongly prefer water over metal
     # Blue hue range: approximately 0.5 to 0.7 in HSV (240° to 180° in degrees, but normalized 0-1)
     is_blue_hue = (avg_h >= 0.45 and avg_h <= 0.75) and avg_s > 0.15
     
-    # Find closest matching Pokémon type color
-    min_distance = float('inf')
-    best_match = "grass"  # Default
-    
-    for type_name, type_color in POKEMON_COLORS.items():
-        # Convert type color to HSV
-        type_h, type_s, type_v = rgb_to_hsv(
-            type_color[0] / 255.0,
-            type_color[1] / 255.0,
-            type_color[2] / 255.0
-        )
+    # Distance to every Pokémon type color at once
+    # Calculate distance in HSV space with weighted components
+    # Hue is most important for distinguishing colors (e.g., blue vs gray)
+    # Use circular distance for hue (0 and 1 are close)
+    hue_diff = np.abs(avg_h - _PALETTE_HSV[:, 0])
+    hue_distance = np.minimum(hue_diff, 1.0 - hue_diff)
+    
+    # Weighted distance: hue is most important (3x), saturation (1.5x), value (1x)
+    hsv_distance = (
+        hue_distance * 3.0 +
+        np.abs(avg_s - _PALETTE_HSV[:, 1]) * 1.5 +
+        np.abs(avg_v - _PALETTE_HSV[:, 2]) * 1.0
+    )
+    
+    # Also calculate RGB distance as a fallback for very desaturated colors
+    q = avg_color.astype(np.float64)
+    rgb_sq_distance = _PALETTE_RGB_SQNORM - 2.0 * (_PALETTE_RGB @ q) + q @ q
+    rgb_distance = np.sqrt(np.maximum(rgb_sq_distance, 0.0))
+    
+    # For very low saturation colors (grays), prefer RGB distance
+    # For colored images, prefer HSV distance, but also consider RGB as tiebreaker
+    if avg_s < 0.1:
+        distance = rgb_distance
+    else:
+        distance = hsv_distance * 50.0 + rgb_distance * 0.1
+    
+    if is_blue_hue:
+        # Blue-ish image: never match metal
+        distance[_METAL_INDEX] = np.inf
+    elif avg_s < 0.1:
+        # Very desaturated (gray) image: never match water
+        distance[_WATER_INDEX] = np.inf
+    
+    return _PALETTE_KEYS[int(np.argmin(distance))]
+
+
+def _image_hash(img: Image.Image) -> str:
+    """Content hash of an image (mode, size and pixel data)."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{_DETECTION_CACHE_VERSION}:{img.mode}:{img.size}".encode())
+    digest.update(img.tobytes())
+    return digest.hexdigest()
+
+
+# Type results depend on the theme palette too, so they are cached per palette
+# and custom themes in src/colors.py invalidate them
+_PALETTE_HASH = hashlib.blake2b(
+    repr((_PALETTE_KEYS, _PALETTE_RGB.tolist())).encode(), digest_size=8
+).hexdigest()
+
+
+def _load_detection_cache() -> dict:
+    """Load cached detection results, or an empty cache if missing/corrupt."""
+    try:
+        with open(DETECTION_CACHE_FILE, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def _save_detection_cache(cache: dict):
+    """Write detection results atomically; failures only cost a cache miss."""
+    atomic_write(DETECTION_CACHE_FILE, lambda f: f.write(json.dumps(cache, indent=2).encode("utf-8")))
+
+
+def _cached_detect(kind: str, img: Image.Image, detector) -> str:
+    """Run a detector, reusing the persisted result for identical image content."""
+    key = _image_hash(img)
+    cache = _load_detection_cache()
+    entry = cache.get(key, {})
+    if kind in entry:
+        return entry[kind]
+    
+    result = detector(img)
+    entry[kind] = result
+    cache[key] = entry
+    _save_detection_cache(cache)
+    return result
+
+
+def detect_variant_cached(img: Image.Image) -> str:
+    """
+    Same as detect_variant, but memoized on disk by image content hash.
+    
+    Args:
+        img: RGB PIL Image
         
-        # Special case: If we detect blue hue, heavily penalize metal
-        if is_blue_hue and type_name == "metal":
-            # Add large penalty to metal when we have a blue-ish image
-            distance = float('inf')
-        elif not is_blue_hue and type_name == "water" and avg_s < 0.1:
-            # If image is very desaturated (gray), penalize water slightly
-            distance = float('inf')
-        else:
-            # Calculate distance in HSV space with weighted components
-            # Hue is most important for distinguishing colors (e.g., blue vs gray)
-            # Use circular distance for hue (0 and 1 are close)
-            hue_diff = abs(avg_h - type_h)
-            hue_distance = min(hue_diff, 1.0 - hue_diff)  # Circular distance
-            
-            # Weighted distance: hue is most important (3x), saturation (1.5x), value (1x)
-            hsv_distance = (
-                hue_distance * 3.0 +
-                abs(avg_s - type_s) * 1.5 +
-                abs(avg_v - type_v) * 1.0
-            )
-            
-            # Also calculate RGB distance as a fallback for very desaturated colors
-            rgb_distance = np.sqrt(
-                (avg_r - type_color[0]) ** 2 +
-                (avg_g - type_color[1]) ** 2 +
-                (avg_b - type_color[2]) ** 2
-            )
-            
-            # For very low saturation colors (grays), prefer RGB distance
-            # For colored images, prefer HSV distance
-            if avg_s < 0.1:
-                # Very desaturated (grayish) - use RGB distance
-                distance = rgb_distance
-            else:
-                # Colored image - use HSV distance, but also consider RGB as tiebreaker
-                distance = hsv_distance * 50.0 + rgb_distance * 0.1
+    Returns:
+        Variant string: "shiny", "holo", "rainbow", or "normal"
+    """
+    return _cached_detect("variant", img, detect_variant)
+
+
+def detect_type_cached(img: Image.Image) -> str:
+    """
+    Same as detect_type, but memoized on disk by image content and palette hash.
+    
+    Args:
+        img: RGB PIL Image
         
-        if distance < min_distance:
-            min_distance = distance
-            best_match = type_name
+    Returns:
+        Type string: "grass", "fire", "water", etc.
+    """
+    return _cached_detect(f"type:{_PALETTE_HASH}", img, detect_type)
+
+
+def color_distance_sq(color1: tuple, color2: tuple) -> int:
+    """
+    Calculate squared Euclidean distance between two RGB colors.
     
-    return best_match
+    Squaring preserves ordering, so this is enough for "closest color"
+    comparisons and avoids the square root entirely.
+    
+    Args:
+        color1: RGB tuple (R, G, B)
+        color2: RGB tuple (R, G, B)
+        
+    Returns:
+        Squared distance value (lower = more similar)
+    """
+    dr = color1[0] - color2[0]
+    dg = color1[1] - color2[1]
+    db = color1[2] - color2[2]
+    return dr * dr + dg * dg + db * db
 
 
 def calculate_color_distance(color1: tuple, color2: tuple) -> float:
     """
     Calculate Euclidean distance between two RGB colors.
     
+    Deprecated: use color_distance_sq when only the ordering matters
+    (e.g. finding the closest color).
+    
     Args:
         color1: RGB tuple (R, G, B)
         color2: RGB tuple (R, G, B)
@@ -198,9 +374,9 @@ def calculate_color_distance(color1: tuple, color2: tuple) -> float:
     Returns:
         Distance value (lower = more similar)
     """
-    return np.sqrt(
-        (color1[0] - color2[0]) ** 2 +
-        (color1[1] - color2[1]) ** 2 +
-        (color1[2] - color2[2]) ** 2
+    warnings.warn(
+        "calculate_color_distance is deprecated; use color_distance_sq instead",
+        DeprecationWarning,
+        stacklevel=2,
     )
-
+    return math.sqrt(color_distance_sq(color1, color2))
@@ -5,14 +5,20 @@ Automatically detects card variant (shiny/holo/normal) and type (grass, fire, et
 from card_front.png and generates appropriate layers.
 """
 
-import os
 import sys
-from PIL import Image, ImageOps
 
-# Add src directory to path for imports
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+if __package__ in (None, ""):
+    # Started as a script (python src/front_generator.py): the relative imports
+    # below need the src package, so point at the supported invocations
+    sys.exit("Run this generator from the project root with "
+             "'python -m src.front_generator' or 'python generate_front.py'.")
+
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
 
-from config import (
+from .config import (
     CARD_WIDTH_MM,
     CARD_HEIGHT_MM,
     DPI,
@@ -23,17 +29,74 @@ from config import (
     OUTPUT_PREVIEW_DIR,
     INPUT_FRONT_IMAGE,
     INPUT_IMAGE,
+    BACKSIDE_CACHE_DIR,
+    CANVAS_CACHE_DIR,
+    PREVIEW_COMPRESS_LEVEL,
+    MASK_COMPRESS_LEVEL,
+    LAYER_COMPRESS_LEVEL,
+    DETECTION_MAX_SIZE,
 )
-from colors import POKEMON_COLORS, get_color, get_shiny_color, RAINBOW_COLORS
-from layers import (
-    prepare_canvas,
+from .cache import file_digest
+from .colors import POKEMON_COLORS, get_color, get_shiny_color_cached, RAINBOW_COLORS
+from .layers import (
     generate_main_layer,
-    generate_mask,
-    generate_spot_uv,
+    generate_mask_layers,
     generate_rainbow_layer,
     generate_holo_layer,
+    load_gray_canvas,
+    save_layers,
+)
+from .detection import detect_variant_cached, detect_type_cached
+from .backside_generator import generate_preview
+
+
+# Bump when backside layer output changes, to invalidate cached layers
+_BACKSIDE_CACHE_VERSION = 1
+
+# Files written per backside theme: (directory kind, file name)
+_BACKSIDE_FILES = (
+    ("layers", "main_color.png"),
+    ("layers", "white_layer.png"),
+    ("layers", "foil_layer.png"),
+    ("layers", "spot_uv_layer.png"),
+    ("preview", "layer_preview.png"),
 )
-from detection import detect_variant, detect_type
+
+
+def _generate_main_layer(gray, theme: str, variant: str):
+    """Generate the main color layer for a type and variant."""
+    if variant == "rainbow":
+        return generate_rainbow_layer(gray, RAINBOW_COLORS)
+    if variant == "shiny":
+        return generate_main_layer(gray, get_shiny_color_cached(theme))
+    
+    # Get base color for the type
+    base_color = get_color(theme)
+    if variant == "holo":
+        return generate_holo_layer(gray, base_color)
+    return generate_main_layer(gray, base_color)  # normal
+
+
+def _generate_layers(gray, theme: str, variant: str) -> tuple:
+    """
+    Generate the main color, white, foil and Spot UV layers for one card side.
+    
+    The main layer and the masks are independent, and their NumPy/PIL passes
+    release the GIL, so the main layer is built on a worker thread while the
+    masks are computed on the calling thread.
+    
+    Args:
+        gray: Grayscale uint8 array of the prepared canvas
+        theme: Type name (e.g., "grass", "fire")
+        variant: Variant name ("normal", "shiny", "holo", "rainbow")
+        
+    Returns:
+        Tuple of (main_layer, white_layer, foil_layer, spot_layer)
+    """
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        main_future = executor.submit(_generate_main_layer, gray, theme, variant)
+        masks = generate_mask_layers(gray, WHITE_THRESHOLD, FOIL_THRESHOLD, SPOT_UV_EDGE_SIZE)
+        return (main_future.result(),) + masks
 
 
 def generate_front_layers(input_image_path: str = None, auto_detect: bool = True, 
@@ -42,7 +105,7 @@ def generate_front_layers(input_image_path: str = None, auto_detect: bool = True
     Generate layers for a single card front image with automatic detection.
     
     Args:
-        input_image_path: Path to the input front image (default: "input/card_front.png")
+        input_image_path: Path to the input front image (default: INPUT_FRONT_IMAGE from config)
         auto_detect: If True, automatically detect variant and type
         theme: Override type detection with manual theme (e.g., "grass", "fire")
         variant: Override variant detection with manual variant ("shiny", "holo", "normal")
@@ -60,8 +123,6 @@ def generate_front_layers(input_image_path: str = None, auto_detect: bool = True
         # Use configured front image path
         if os.path.exists(INPUT_FRONT_IMAGE):
             input_image_path = INPUT_FRONT_IMAGE
-        elif os.path.exists("input/card_front.png"):
-            input_image_path = "input/card_front.png"
         else:
             print(f"❌ Error: No input image found")
             print(f"   Please place your card front at: {INPUT_FRONT_IMAGE}")
@@ -74,37 +135,41 @@ def generate_front_layers(input_image_path: str = None, auto_detect: bool = True
     
     print(f"📥 Loading: {input_image_path}")
     
-    # Load and prepare image (keep original for detection, then prepare canvas)
+    # Load and prepare image (decode the original only for detection, then
+    # prepare the canvas)
     try:
-        img_original = Image.open(input_image_path).convert("RGB")
-        print(f"   Original size: {img_original.size[0]}x{img_original.size[1]} px")
-        
-        # Detect variant and type BEFORE preparing canvas
-        detected_variant = None
-        detected_type = None
+        # Only detect what was not given manually (variant detection is
+        # also skipped when auto-detection is off; it defaults to normal)
+        need_variant = auto_detect and not variant
+        need_type = not theme
+        detected_variant = variant.lower() if variant else "normal"
+        detected_type = theme.lower() if theme else None
         
-        if auto_detect:
-            print()
-            print("🔍 Analyzing card...")
-            detected_variant = detect_variant(img_original)
-            detected_type = detect_type(img_original)
-            print(f"   ✓ Detected Variant: {detected_variant.capitalize()}")
-            print(f"   ✓ Detected Type: {detected_type.capitalize()}")
-        else:
-            if variant is None:
-                detected_variant = "normal"
-            else:
-                detected_variant = variant.lower()
+        with Image.open(input_image_path) as original:  # Reads the header only
+            print(f"   Original size: {original.size[0]}x{original.size[1]} px")
             
-            if theme is None:
-                detected_type = detect_type(img_original)
+            # Detect BEFORE preparing canvas, on a small nearest-neighbor
+            # thumbnail: a plain pixel subsample, so the edge statistics
+            # match the full image without touching every pixel
+            if need_variant or need_type:
+                detection_img = original.convert("RGB")
+                detection_img.thumbnail((DETECTION_MAX_SIZE, DETECTION_MAX_SIZE), Image.NEAREST)
+        
+        if need_variant or need_type:
+            if auto_detect:
+                print()
+                print("🔍 Analyzing card...")
+            if need_variant:
+                detected_variant = detect_variant_cached(detection_img)
+                print(f"   ✓ Detected Variant: {detected_variant.capitalize()}")
+            if need_type:
+                detected_type = detect_type_cached(detection_img)
                 print(f"   ✓ Detected Type: {detected_type.capitalize()}")
-            else:
-                detected_type = theme.lower()
         
-        # Now prepare canvas for layer generation
-        img = prepare_canvas(img_original, CARD_WIDTH_MM, CARD_HEIGHT_MM, DPI)
-        print(f"   Prepared size: {img.size[0]}x{img.size[1]} px ({CARD_WIDTH_MM}x{CARD_HEIGHT_MM} mm @ {DPI} DPI)")
+        # Now prepare canvas for layer generation, converted to grayscale once
+        # (every layer generator reads this uint8 array; cached on disk)
+        gray = load_gray_canvas(input_image_path, CARD_WIDTH_MM, CARD_HEIGHT_MM, DPI, CANVAS_CACHE_DIR)
+        print(f"   Prepared size: {gray.shape[1]}x{gray.shape[0]} px ({CARD_WIDTH_MM}x{CARD_HEIGHT_MM} mm @ {DPI} DPI)")
         
     except Exception as e:
         print(f"❌ Error loading image: {e}")
@@ -125,36 +190,20 @@ def generate_front_layers(input_image_path: str = None, auto_detect: bool = True
         print(f"   Available types: {', '.join(POKEMON_COLORS.keys())}")
         return False
     
-    # Get base color for the type
-    base_color = get_color(detected_type)
-    
     print()
     print("🔧 Generating layers...")
     print(f"   Type: {detected_type.capitalize()}, Variant: {detected_variant.capitalize()}")
     
-    # Convert to grayscale for processing
-    gray = ImageOps.grayscale(img)
-    
-    # Generate main color layer based on variant
-    if detected_variant == "rainbow":
-        main_layer = generate_rainbow_layer(gray, RAINBOW_COLORS)
-        variant_suffix = "rainbow"
-    elif detected_variant == "shiny":
-        shiny_color = get_shiny_color(base_color)
-        main_layer = generate_main_layer(gray, shiny_color)
-        variant_suffix = "shiny"
-    elif detected_variant == "holo":
-        main_layer = generate_holo_layer(gray, base_color)
-        variant_suffix = "holo"
-    else:  # normal
-        main_layer = generate_main_layer(gray, base_color)
+    # Generate main color layer based on variant, plus the other layers
+    # (same for all variants)
+    main_layer, white_layer, foil_layer, spot_layer = _generate_layers(
+        gray, detected_type, detected_variant
+    )
+    if detected_variant in ("rainbow", "shiny", "holo"):
+        variant_suffix = detected_variant
+    else:
         variant_suffix = "normal"
     
-    # Generate other layers (same for all variants)
-    white_layer = generate_mask(gray, WHITE_THRESHOLD)
-    foil_layer = generate_mask(gray, FOIL_THRESHOLD)
-    spot_layer = generate_spot_uv(gray, SPOT_UV_EDGE_SIZE)
-    
     # Determine output prefix
     if output_prefix is None:
         if variant_suffix == "normal":
@@ -174,19 +223,23 @@ def generate_front_layers(input_image_path: str = None, auto_detect: bool = True
     foil_path = os.path.join(output_dir, "foil_layer.png")
     spot_path = os.path.join(output_dir, "spot_uv_layer.png")
     
-    main_layer.save(main_path)
-    white_layer.save(white_path)
-    foil_layer.save(foil_path)
-    spot_layer.save(spot_path)
+    # Save all layers concurrently
+    save_layers([
+        (main_layer, main_path, {"compress_level": LAYER_COMPRESS_LEVEL}),
+        (white_layer, white_path, {"compress_level": MASK_COMPRESS_LEVEL}),
+        (foil_layer, foil_path, {"compress_level": MASK_COMPRESS_LEVEL}),
+        (spot_layer, spot_path, {"compress_level": MASK_COMPRESS_LEVEL}),
+    ])
     
     print(f"   ✓ Main color layer: {main_path}")
     print(f"   ✓ White layer: {white_path}")
     print(f"   ✓ Foil layer: {foil_path}")
     print(f"   ✓ Spot UV layer: {spot_path}")
     
-    # Generate simple preview (single image showing main layer)
+    # Generate simple preview (single image showing main layer); it is the
+    # same image, so copy the encoded file instead of encoding it twice
     preview_path = os.path.join(preview_dir, "preview.png")
-    main_layer.save(preview_path)
+    shutil.copyfile(main_path, preview_path)
     print(f"   ✓ Preview: {preview_path}")
     
     print()
@@ -207,6 +260,48 @@ def generate_front_layers(input_image_path: str = None, auto_detect: bool = True
     return True
 
 
+def _backside_cache_key(theme: str, variant: str) -> str:
+    """Hash of the backside base image content and every setting that shapes its layers."""
+    # Key on the colors themselves, not just the theme name, so edits to
+    # src/colors.py invalidate the cached layers
+    if variant == "rainbow":
+        colors = tuple(RAINBOW_COLORS)
+    elif variant == "shiny":
+        colors = get_shiny_color_cached(theme)
+    else:
+        colors = get_color(theme)
+    
+    settings = (_BACKSIDE_CACHE_VERSION, theme, variant, colors, CARD_WIDTH_MM, CARD_HEIGHT_MM, DPI,
+                WHITE_THRESHOLD, FOIL_THRESHOLD, SPOT_UV_EDGE_SIZE)
+    return file_digest(INPUT_IMAGE, settings)
+
+
+def _restore_cached_backside(cache_dir: str, layer_dir: str, preview_dir: str) -> bool:
+    """Copy cached backside files into the output directories; False on a cache miss."""
+    if not all(os.path.isfile(os.path.join(cache_dir, name)) for _, name in _BACKSIDE_FILES):
+        return False
+    for kind, name in _BACKSIDE_FILES:
+        target_dir = layer_dir if kind == "layers" else preview_dir
+        shutil.copyfile(os.path.join(cache_dir, name), os.path.join(target_dir, name))
+    return True
+
+
+def _store_backside_cache(cache_dir: str, layer_dir: str, preview_dir: str):
+    """Copy freshly written backside files into the cache; failures only cost a cache miss."""
+    tmp_dir = cache_dir + ".tmp"
+    try:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for kind, name in _BACKSIDE_FILES:
+            source_dir = layer_dir if kind == "layers" else preview_dir
+            shutil.copyfile(os.path.join(source_dir, name), os.path.join(tmp_dir, name))
+        # A stale or partial entry would make the replace fail on every run
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        os.replace(tmp_dir, cache_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
 def generate_matching_backside(theme: str, variant: str) -> bool:
     """
     Generate backside layers matching the detected front card type and variant.
@@ -225,11 +320,6 @@ def generate_matching_backside(theme: str, variant: str) -> bool:
         return False
     
     try:
-        # Load backside base image
-        backside_img = Image.open(INPUT_IMAGE).convert("RGB")
-        backside_img = prepare_canvas(backside_img, CARD_WIDTH_MM, CARD_HEIGHT_MM, DPI)
-        backside_gray = ImageOps.grayscale(backside_img)
-        
         # Determine theme directory name
         if variant == "normal":
             theme_dir = theme
@@ -244,24 +334,19 @@ def generate_matching_backside(theme: str, variant: str) -> bool:
         os.makedirs(backside_layer_dir, exist_ok=True)
         os.makedirs(backside_preview_dir, exist_ok=True)
         
-        # Get base color for the type
-        base_color = get_color(theme)
+        # Unchanged base image and settings: reuse the layers from the last run
+        cache_dir = os.path.join(BACKSIDE_CACHE_DIR, _backside_cache_key(theme, variant))
+        if _restore_cached_backside(cache_dir, backside_layer_dir, backside_preview_dir):
+            print(f"   ✓ Backside layers restored from cache to {backside_layer_dir}/")
+            return True
         
-        # Generate main color layer based on variant
-        if variant == "rainbow":
-            main_layer = generate_rainbow_layer(backside_gray, RAINBOW_COLORS)
-        elif variant == "shiny":
-            shiny_color = get_shiny_color(base_color)
-            main_layer = generate_main_layer(backside_gray, shiny_color)
-        elif variant == "holo":
-            main_layer = generate_holo_layer(backside_gray, base_color)
-        else:  # normal
-            main_layer = generate_main_layer(backside_gray, base_color)
+        # Load backside base image (prepared grayscale canvas, cached on disk)
+        backside_gray = load_gray_canvas(INPUT_IMAGE, CARD_WIDTH_MM, CARD_HEIGHT_MM, DPI, CANVAS_CACHE_DIR)
         
-        # Generate other layers
-        white_layer = generate_mask(backside_gray, WHITE_THRESHOLD)
-        foil_layer = generate_mask(backside_gray, FOIL_THRESHOLD)
-        spot_layer = generate_spot_uv(backside_gray, SPOT_UV_EDGE_SIZE)
+        # Generate main color layer based on variant, plus the other layers
+        main_layer, white_layer, foil_layer, spot_layer = _generate_layers(
+            backside_gray, theme, variant
+        )
         
         # Save backside layers
         main_path = os.path.join(backside_layer_dir, "main_color.png")
@@ -269,26 +354,23 @@ def generate_matching_backside(theme: str, variant: str) -> bool:
         foil_path = os.path.join(backside_layer_dir, "foil_layer.png")
         spot_path = os.path.join(backside_layer_dir, "spot_uv_layer.png")
         
-        main_layer.save(main_path)
-        white_layer.save(white_path)
-        foil_layer.save(foil_path)
-        spot_layer.save(spot_path)
-        
-        # Generate preview (2x2 grid)
-        card_width = main_layer.width
-        card_height = main_layer.height
-        preview = Image.new("RGB", (card_width * 2, card_height * 2))
-        
-        preview.paste(main_layer, (0, 0))
-        white_preview = ImageOps.colorize(white_layer, black=(0, 0, 0), white=(255, 255, 255))
-        preview.paste(white_preview, (card_width, 0))
-        foil_preview = ImageOps.colorize(foil_layer, black=(0, 0, 0), white=(255, 215, 0))
-        preview.paste(foil_preview, (0, card_height))
-        spot_preview = ImageOps.colorize(spot_layer, black=(0, 0, 0), white=(0, 255, 255))
-        preview.paste(spot_preview, (card_width, card_height))
+        # Generate preview (2x2 grid), same layout as the backside generator
+        preview = generate_preview(
+            main_layer, white_layer, foil_layer, spot_layer,
+            main_layer.width, main_layer.height
+        )
         
         preview_path = os.path.join(backside_preview_dir, "layer_preview.png")
-        preview.save(preview_path)
+        
+        # Save all layers and the preview concurrently
+        save_layers([
+            (main_layer, main_path, {"compress_level": LAYER_COMPRESS_LEVEL}),
+            (white_layer, white_path, {"compress_level": MASK_COMPRESS_LEVEL}),
+            (foil_layer, foil_path, {"compress_level": MASK_COMPRESS_LEVEL}),
+            (spot_layer, spot_path, {"compress_level": MASK_COMPRESS_LEVEL}),
+            (preview, preview_path, {"compress_level": PREVIEW_COMPRESS_LEVEL}),
+        ])
+        _store_backside_cache(cache_dir, backside_layer_dir, backside_preview_dir)
         
         print(f"   ✓ Backside layers saved to {backside_layer_dir}/")
         return True
@@ -301,10 +383,10 @@ def generate_matching_backside(theme: str, variant: str) -> bool:
 if __name__ == "__main__":
     # Parse command line arguments
     # Usage: 
-    #   python src/front_generator.py                          # Auto-detect from input/card_front.png
-    #   python src/front_generator.py <image_path>            # Auto-detect from custom image
-    #   python src/front_generator.py <image_path> <theme>    # Override type
-    #   python src/front_generator.py <image_path> <theme> <variant>  # Override both
+    #   python -m src.front_generator                          # Auto-detect from input/card_front.png
+    #   python -m src.front_generator <image_path>            # Auto-detect from custom image
+    #   python -m src.front_generator <image_path> <theme>    # Override type
+    #   python -m src.front_generator <image_path> <theme> <variant>  # Override both
     
     input_image = None
     theme = None
@@ -313,7 +395,7 @@ if __name__ == "__main__":
     
     if len(sys.argv) == 1:
         # No arguments: use default card_front.png with auto-detection
-        print("🔍 Auto-detecting from input/card_front.png...")
+        print(f"🔍 Auto-detecting from {INPUT_FRONT_IMAGE}...")
         success = generate_front_layers(auto_detect=True)
     elif len(sys.argv) == 2:
         # One argument: custom image path with auto-detection
@@ -344,16 +426,16 @@ if __name__ == "__main__":
         )
     else:
         print("Usage:")
-        print("  python src/front_generator.py                                    # Auto-detect from input/card_front.png")
-        print("  python src/front_generator.py <image_path>                      # Auto-detect from custom image")
-        print("  python src/front_generator.py <image_path> <theme>              # Override type detection")
-        print("  python src/front_generator.py <image_path> <theme> <variant>    # Override type and variant")
+        print("  python -m src.front_generator                                    # Auto-detect from input/card_front.png")
+        print("  python -m src.front_generator <image_path>                      # Auto-detect from custom image")
+        print("  python -m src.front_generator <image_path> <theme>              # Override type detection")
+        print("  python -m src.front_generator <image_path> <theme> <variant>    # Override type and variant")
         print()
         print("Examples:")
-        print("  python src/front_generator.py                                    # Auto-detect everything")
-        print("  python src/front_generator.py input/card_front.png               # Auto-detect from custom image")
-        print("  python src/front_generator.py input/card_front.png fire          # Force fire type")
-        print("  python src/front_generator.py input/card_front.png fire shiny    # Force fire + shiny")
+        print("  python -m src.front_generator                                    # Auto-detect everything")
+        print("  python -m src.front_generator input/card_front.png               # Auto-detect from custom image")
+        print("  python -m src.front_generator input/card_front.png fire          # Force fire type")
+        print("  python -m src.front_generator input/card_front.png fire shiny    # Force fire + shiny")
         print()
         print("Available themes:", ", ".join(POKEMON_COLORS.keys()))
         print("Available variants: normal, shiny, holo, rainbow")
@@ -5,10 +5,66 @@ This module contains all the core image processing logic for creating
 print-ready layers from a base artwork.
 """
 
-from PIL import Image, ImageOps, ImageFilter
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Union
+
+from PIL import Image
 import numpy as np
 
+from .cache import atomic_write, file_digest
+
+
+# Bump when canvas preparation changes, to invalidate cached canvases
+_CANVAS_CACHE_VERSION = 1
+
+# Layer generators accept either a grayscale PIL Image or its pixels as a
+# uint8 array, so batch callers can convert once and reuse the array
+GrayInput = Union[Image.Image, np.ndarray]
+
+
+def _as_array(gray: GrayInput) -> np.ndarray:
+    """Return grayscale pixels as a 2D uint8 array without re-converting arrays."""
+    if isinstance(gray, np.ndarray):
+        return gray
+    return np.asarray(gray, dtype=np.uint8)
+
+
+def _as_image(gray: GrayInput) -> Image.Image:
+    """Return grayscale input as a PIL Image (mode "L"), wrapping arrays."""
+    if isinstance(gray, np.ndarray):
+        return Image.fromarray(gray)
+    return gray
+
+
+def _pack_rgbx(luts: np.ndarray) -> np.ndarray:
+    """
+    Pack (..., 3) uint8 RGB table entries into one uint32 per entry.
+    
+    Each entry keeps its bytes in R, G, B, X memory order, so a 1D take moves
+    one 4-byte word per pixel instead of a 3-byte row.
+    
+    Args:
+        luts: uint8 array of shape (..., 3)
+        
+    Returns:
+        Flat uint32 array with one packed RGBX entry per table row
+    """
+    rgbx = np.zeros(luts.shape[:-1] + (4,), dtype=np.uint8)
+    rgbx[..., :3] = luts
+    return rgbx.view(np.uint32).reshape(-1)
+
+
+def _rgbx_image(pixels: np.ndarray) -> Image.Image:
+    """Decode an (h, w) array of packed RGBX pixels straight into an RGB image."""
+    h, w = pixels.shape
+    # PIL stores RGB as 4 bytes per pixel, so the RGBX raw decoder is a plain
+    # row copy, unlike fromarray() repacking an (h, w, 3) array
+    return Image.frombytes("RGB", (w, h), pixels, "raw", "RGBX")
 
+
+@lru_cache(maxsize=None)
 def mm_to_px(mm: float, dpi: int) -> int:
     """
     Convert millimeters to pixels at given DPI.
@@ -23,17 +79,21 @@ def mm_to_px(mm: float, dpi: int) -> int:
     return int(mm / 25.4 * dpi)
 
 
-def prepare_canvas(img: Image.Image, width_mm: float, height_mm: float, dpi: int) -> Image.Image:
+def prepare_canvas(img: Image.Image, width_mm: float, height_mm: float, dpi: int,
+                   resample: int = Image.LANCZOS) -> Image.Image:
     """
     Prepare input image: crop to exact aspect ratio and resize to target dimensions.
     
     Maintains aspect ratio by center-cropping, then resizes to exact print dimensions.
+    Images that already have the target pixel size are returned without resampling.
     
     Args:
         img: Input PIL Image
         width_mm: Target width in millimeters
         height_mm: Target height in millimeters
         dpi: Resolution in dots per inch
+        resample: PIL resampling filter (default LANCZOS; BILINEAR is much
+                  faster where print quality is not needed)
         
     Returns:
         Processed PIL Image ready for layer generation
@@ -54,12 +114,107 @@ def prepare_canvas(img: Image.Image, width_mm: float, height_mm: float, dpi: int
         top = (h - new_h) // 2
         img = img.crop((0, top, w, top + new_h))
 
-    # Resize to exact target dimensions
+    # Resize to exact target dimensions (skipped if already there)
     target_size = (mm_to_px(width_mm, dpi), mm_to_px(height_mm, dpi))
-    return img.resize(target_size, Image.LANCZOS)
+    if img.size == target_size:
+        return img
+    return img.resize(target_size, resample)
+
+
+def to_grayscale(img: Image.Image) -> np.ndarray:
+    """
+    Convert an RGB image to grayscale pixels, once, for all layer generators.
+    
+    Uses PIL's C conversion (ITU-R 601-2 luma, same as ImageOps.grayscale),
+    which is both faster and exact compared to a float NumPy dot product.
+    
+    Args:
+        img: RGB PIL Image
+        
+    Returns:
+        2D uint8 array of luminance values
+    """
+    return np.asarray(img.convert("L"), dtype=np.uint8)
+
+
+def load_gray_canvas(image_path: str, width_mm: float, height_mm: float, dpi: int,
+                     cache_dir: str) -> np.ndarray:
+    """
+    Load an image, prepare the print canvas and convert it to grayscale.
+    
+    The result is cached on disk, keyed by the image file content and the
+    card size/DPI settings, so repeated runs on the same artwork skip
+    decoding, the LANCZOS resize and the grayscale conversion.
+    
+    Args:
+        image_path: Path to the input image
+        width_mm: Target width in millimeters
+        height_mm: Target height in millimeters
+        dpi: Resolution in dots per inch
+        cache_dir: Directory holding cached canvases (.npy files)
+        
+    Returns:
+        2D uint8 array of the prepared grayscale canvas
+    """
+    key = file_digest(image_path, (_CANVAS_CACHE_VERSION, width_mm, height_mm, dpi))
+    cache_path = os.path.join(cache_dir, key + ".npy")
+    
+    # A truncated or foreign entry (e.g. left by a crash or a full disk) is
+    # dropped and rebuilt like a miss
+    expected_shape = (mm_to_px(height_mm, dpi), mm_to_px(width_mm, dpi))
+    try:
+        gray = np.load(cache_path)
+        if (isinstance(gray, np.ndarray) and gray.dtype == np.uint8
+                and gray.shape == expected_shape):
+            return gray
+        os.remove(cache_path)
+    except (OSError, ValueError, EOFError):
+        try:
+            os.remove(cache_path)
+        except OSError:
+            pass
+    
+    img = Image.open(image_path).convert("RGB")
+    img = prepare_canvas(img, width_mm, height_mm, dpi)
+    gray = to_grayscale(img)
+    
+    atomic_write(cache_path, lambda f: np.save(f, gray))
+    return gray
+
+
+def _tint_tables(colors: np.ndarray) -> np.ndarray:
+    """
+    Build tint lookup tables mapping each gray level to g * color / 255.
+    
+    Args:
+        colors: Integer RGB array of shape (..., 3), values 0-255
+        
+    Returns:
+        uint8 array of shape (..., 256, 3)
+    """
+    levels = np.arange(256, dtype=np.uint32)[:, None]
+    x = levels * np.asarray(colors, dtype=np.uint32)[..., None, :]
+    # (x + 1 + (x >> 8)) >> 8 is an exact floor(x / 255) for x <= 255 * 255
+    return ((x + 1 + (x >> 8)) >> 8).astype(np.uint8)
+
+
+@lru_cache(maxsize=None)
+def _build_tint_lut(color: tuple) -> np.ndarray:
+    """
+    Build a (256, 3) lookup table mapping each gray level to g * color / 255.
+    
+    Args:
+        color: RGB tuple (R, G, B)
+        
+    Returns:
+        Read-only uint8 array of shape (256, 3)
+    """
+    lut = _tint_tables(color)
+    lut.setflags(write=False)  # Shared between calls via the cache
+    return lut
 
 
-def generate_main_layer(gray: Image.Image, color: tuple) -> Image.Image:
+def generate_main_layer(gray: GrayInput, color: tuple) -> Image.Image:
     """
     Generate main color layer by applying theme color while preserving luminance.
     
@@ -67,22 +222,59 @@ def generate_main_layer(gray: Image.Image, color: tuple) -> Image.Image:
     the original brightness variations.
     
     Args:
-        gray: Grayscale PIL Image (mode "L")
+        gray: Grayscale PIL Image (mode "L") or its uint8 pixel array
         color: RGB tuple (R, G, B) for theme color
         
     Returns:
         Colorized PIL Image (mode "RGB")
     """
-    g = np.array(gray)
-    out = np.zeros((g.shape[0], g.shape[1], 3), dtype=np.uint8)
+    lut = _build_tint_lut(tuple(color))
     
-    for i in range(3):
-        out[..., i] = (g / 255.0 * color[i]).astype(np.uint8)
+    # Each channel is a 256-entry point() table over the gray image, applied
+    # in PIL's C loop and merged: no per-pixel arithmetic or NumPy round trip
+    gray = _as_image(gray)
+    return Image.merge("RGB", [gray.point(lut[:, channel].tobytes()) for channel in range(3)])
+
+
+@lru_cache(maxsize=16)
+def _rainbow_tables(w: int, rainbow_colors: tuple) -> tuple:
+    """
+    Build the rainbow tint tables for an image width, once per (width, colors).
     
-    return Image.fromarray(out)
+    Args:
+        w: Image width in pixels
+        rainbow_colors: Tuple of RGB tuples for rainbow gradient
+        
+    Returns:
+        Tuple of (luts, column_offset): flattened (bands * 256,) tint tables
+        packed as uint32 RGBX, and each column's intp offset of its band table
+    """
+    # Create gradient based on horizontal position
+    num_colors = len(rainbow_colors)
+    palette = np.asarray(rainbow_colors, dtype=np.float64)
+    
+    # Calculate which color segment every column is in
+    pos = np.arange(w) / w  # 0.0 to 1.0
+    segment = pos * (num_colors - 1)
+    idx = np.minimum(segment.astype(np.int64), num_colors - 2)
+    t = (segment - idx)[:, None]  # Interpolation factor (0.0 to 1.0)
+    
+    # Interpolate between two colors for all columns at once -> (w, 3)
+    column_colors = (palette[idx] * (1 - t) + palette[idx + 1] * t).astype(np.uint8)
+    
+    # One tint table per distinct column color; indexing the flattened tables
+    # with precomputed column offsets keeps the gather a 1D take
+    band_colors, band = np.unique(column_colors, axis=0, return_inverse=True)
+    luts = _pack_rgbx(_tint_tables(band_colors))
+    column_offset = band.reshape(w).astype(np.intp) * 256
+    
+    # Shared between calls via the cache
+    luts.setflags(write=False)
+    column_offset.setflags(write=False)
+    return luts, column_offset
 
 
-def generate_rainbow_layer(gray: Image.Image, rainbow_colors: list) -> Image.Image:
+def generate_rainbow_layer(gray: GrayInput, rainbow_colors: list) -> Image.Image:
     """
     Generate rainbow gradient layer by applying color gradient based on horizontal position.
     
@@ -90,45 +282,62 @@ def generate_rainbow_layer(gray: Image.Image, rainbow_colors: list) -> Image.Ima
     the horizontal position in the image.
     
     Args:
-        gray: Grayscale PIL Image (mode "L")
+        gray: Grayscale PIL Image (mode "L") or its uint8 pixel array
         rainbow_colors: List of RGB tuples for rainbow gradient
         
     Returns:
         Rainbow colorized PIL Image (mode "RGB")
     """
-    g = np.array(gray)
-    h, w = g.shape
-    out = np.zeros((h, w, 3), dtype=np.uint8)
+    g = _as_array(gray)
+    luts, column_offset = _rainbow_tables(g.shape[1], tuple(map(tuple, rainbow_colors)))
     
-    # Create gradient based on horizontal position
-    num_colors = len(rainbow_colors)
+    # Single gather: out[y, x] = luts[band[x], g[y, x]] (preserving luminance)
+    out = luts.take(column_offset[None, :] + g)
     
-    for x in range(w):
-        # Calculate which color segment we're in
-        pos = x / w  # 0.0 to 1.0
-        segment = pos * (num_colors - 1)
-        idx = int(segment)
-        t = segment - idx  # Interpolation factor (0.0 to 1.0)
-        
-        # Handle edge case
-        if idx >= num_colors - 1:
-            idx = num_colors - 2
-            t = 1.0
-        
-        # Interpolate between two colors
-        c1 = np.array(rainbow_colors[idx])
-        c2 = np.array(rainbow_colors[idx + 1])
-        color = (c1 * (1 - t) + c2 * t).astype(np.uint8)
+    return _rgbx_image(out)
+
+
+@lru_cache(maxsize=16)
+def _holo_tables(bands: int, base_color: tuple) -> np.ndarray:
+    """
+    Build the holo tint tables for every diagonal band, once per (bands, color).
+    
+    Args:
+        bands: Number of diagonal bands (h + w - 1)
+        base_color: Base RGB color tuple
         
-        # Apply color to grayscale values (preserving luminance)
-        for y in range(h):
-            luminance = g[y, x] / 255.0
-            out[y, x] = (color * luminance).astype(np.uint8)
+    Returns:
+        Flattened (bands * 256,) tint tables packed as uint32 RGBX
+    """
+    base = np.asarray(base_color, dtype=np.float64)
+    
+    # The holo color only depends on the diagonal band x + y, so build one
+    # (256, 3) table per band and look every pixel up in a single gather
+    diag = np.arange(bands) / (bands + 1)
+    
+    # Shift colors based on diagonal position (rainbow-like effect)
+    angle = diag * 6.28318  # 0 to 2*PI
+    
+    # Calculate color shift (sine waves for RGB, +0/+120/+240 degrees)
+    phase = np.array([0.0, 2.094, 4.189])
+    shift = np.sin(angle[:, None] + phase) * 60 + base
+    
+    # Blend with base color, then scale by every possible luminance
+    blend = shift * 0.7 + base * 0.3
+    luminance = np.arange(256) / 255.0
+    # Clipping before the cast truncates the same as int() then clamping. The
+    # outer product keeps gray levels innermost (contiguous) and skips the
+    # int64 temporary; packing gives one RGBX word per (band, gray) entry
+    luts = np.multiply.outer(blend, luminance)
+    np.clip(luts, 0, 255, out=luts)
+    luts = _pack_rgbx(luts.astype(np.uint8).transpose(0, 2, 1))
     
-    return Image.fromarray(out)
+    # Shared between calls via the cache
+    luts.setflags(write=False)
+    return luts
 
 
-def generate_holo_layer(gray: Image.Image, base_color: tuple) -> Image.Image:
+def generate_holo_layer(gray: GrayInput, base_color: tuple) -> Image.Image:
     """
     Generate holographic layer with iridescent effect.
     
@@ -136,47 +345,25 @@ def generate_holo_layer(gray: Image.Image, base_color: tuple) -> Image.Image:
     to simulate holographic/iridescent appearance.
     
     Args:
-        gray: Grayscale PIL Image (mode "L")
+        gray: Grayscale PIL Image (mode "L") or its uint8 pixel array
         base_color: Base RGB color tuple
         
     Returns:
         Holographic colorized PIL Image (mode "RGB")
     """
-    g = np.array(gray)
+    g = _as_array(gray)
     h, w = g.shape
-    out = np.zeros((h, w, 3), dtype=np.uint8)
-    
-    # Create holo effect with diagonal gradient and color shifting
-    for y in range(h):
-        for x in range(w):
-            # Create diagonal gradient for holo effect
-            diag = (x + y) / (w + h)
-            luminance = g[y, x] / 255.0
-            
-            # Shift colors based on diagonal position (rainbow-like effect)
-            angle = diag * 6.28318  # 0 to 2*PI
-            
-            # Calculate color shift (sine waves for RGB)
-            r_shift = np.sin(angle) * 60 + base_color[0]
-            g_shift = np.sin(angle + 2.094) * 60 + base_color[1]  # +120 degrees
-            b_shift = np.sin(angle + 4.189) * 60 + base_color[2]  # +240 degrees
-            
-            # Blend with base color
-            # NOTE: Use g_val instead of g to avoid overwriting the grayscale array 'g'
-            r = int((r_shift * 0.7 + base_color[0] * 0.3) * luminance)
-            g_val = int((g_shift * 0.7 + base_color[1] * 0.3) * luminance)
-            b = int((b_shift * 0.7 + base_color[2] * 0.3) * luminance)
-            
-            out[y, x] = [
-                max(0, min(255, r)),
-                max(0, min(255, g_val)),
-                max(0, min(255, b))
-            ]
-    
-    return Image.fromarray(out)
-
-
-def generate_mask(gray: Image.Image, threshold: int) -> Image.Image:
+    luts = _holo_tables(h + w - 1, tuple(int(c) for c in base_color))
+    
+    # Flat table index (x + y) * 256 + g, gathered with a single 1D take
+    band_offset = (np.arange(h, dtype=np.intp)[:, None] + np.arange(w, dtype=np.intp)[None, :]) * 256
+    band_offset += g
+    out = luts.take(band_offset)
+    
+    return _rgbx_image(out)
+
+
+def generate_mask(gray: GrayInput, threshold: int) -> Image.Image:
     """
     Generate binary mask layer based on grayscale threshold.
     
@@ -184,18 +371,49 @@ def generate_mask(gray: Image.Image, threshold: int) -> Image.Image:
     Used for white ink and foil layers.
     
     Args:
-        gray: Grayscale PIL Image (mode "L")
+        gray: Grayscale PIL Image (mode "L") or its uint8 pixel array
         threshold: Threshold value (0-255)
         
     Returns:
         Binary mask PIL Image (mode "L")
     """
-    g = np.array(gray)
-    mask = np.where(g > threshold, 255, 0).astype(np.uint8)
-    return Image.fromarray(mask, mode="L")
+    # The boolean comparison is already one byte per pixel: viewing it as
+    # uint8 (0/1) and scaling by a uint8 255 never widens to int64
+    mask = (_as_array(gray) > threshold).view(np.uint8) * np.uint8(255)
+    return Image.fromarray(mask)
 
 
-def generate_spot_uv(gray: Image.Image, edge_size: int) -> Image.Image:
+def _max_filter(a: np.ndarray, size: int) -> np.ndarray:
+    """
+    Square max filter (dilation) of a 2D array, clipped at the image borders.
+    
+    Same result as PIL's ImageFilter.MaxFilter(size), but separable: a
+    horizontal then a vertical 1D max, each a few in-place np.maximum
+    passes over shifted slices, instead of ranking size^2 pixels per pixel.
+    
+    Args:
+        a: 2D array
+        size: Odd window size
+        
+    Returns:
+        Dilated array, same shape and dtype
+    """
+    radius = size // 2
+    for axis in (1, 0):
+        src = a
+        a = src.copy()
+        for d in range(1, radius + 1):
+            head = [slice(None)] * 2
+            tail = [slice(None)] * 2
+            head[axis] = slice(d, None)
+            tail[axis] = slice(None, -d)
+            head, tail = tuple(head), tuple(tail)
+            np.maximum(a[head], src[tail], out=a[head])
+            np.maximum(a[tail], src[head], out=a[tail])
+    return a
+
+
+def generate_spot_uv(gray: GrayInput, edge_size: int) -> Image.Image:
     """
     Generate Spot UV / emboss layer from edge detection.
     
@@ -203,7 +421,7 @@ def generate_spot_uv(gray: Image.Image, edge_size: int) -> Image.Image:
     to create printable emboss/spot UV mask.
     
     Args:
-        gray: Grayscale PIL Image (mode "L")
+        gray: Grayscale PIL Image (mode "L") or its uint8 pixel array
         edge_size: Size of edge filter (affects line thickness)
                    Must be odd number >= 3 (will be adjusted if invalid)
         
@@ -219,15 +437,66 @@ def generate_spot_uv(gray: Image.Image, edge_size: int) -> Image.Image:
     else:
         filter_size = edge_size
     
-    # Detect edges
-    edges = gray.filter(ImageFilter.FIND_EDGES)
+    g = _as_array(gray)
+    
+    # Detect edges: same as PIL's FIND_EDGES, the Laplacian 8 * center minus
+    # the 8 neighbors (clamped to 0-255), with border pixels copied unchanged.
+    # Only "edge strength > 40" is kept, and clamping never changes that test,
+    # so the raw Laplacian is thresholded directly (border pixels: g > 40)
+    strong = g > 40
+    s = g.astype(np.int16)
+    rows = s[:-2] + s[1:-1] + s[2:]
+    box = rows[:, :-2] + rows[:, 1:-1] + rows[:, 2:]
+    strong[1:-1, 1:-1] = s[1:-1, 1:-1] * 9 - box > 40
     
-    # Dilate edges to make them thicker/printable
-    edges = edges.filter(ImageFilter.MaxFilter(filter_size))
+    # Dilate edges to make them thicker/printable; max and threshold commute,
+    # so dilating the 0/1 mask equals thresholding the dilated edges
+    strong = _max_filter(strong.view(np.uint8), filter_size)
     
     # Convert to binary mask
-    g = np.array(edges)
-    spot_uv = np.where(g > 40, 255, 0).astype(np.uint8)
+    return Image.fromarray(strong * np.uint8(255))
+
+
+def generate_mask_layers(gray: GrayInput, white_threshold: int, foil_threshold: int,
+                         edge_size: int) -> tuple:
+    """
+    Generate the white, foil and Spot UV masks for a grayscale image.
     
-    return Image.fromarray(spot_uv, mode="L")
+    These layers only depend on the grayscale artwork, not on theme or
+    variant, so callers compute them once from one grayscale input and
+    share them between variants.
+    
+    Args:
+        gray: Grayscale PIL Image (mode "L") or its uint8 pixel array
+        white_threshold: Threshold for the white ink layer (0-255)
+        foil_threshold: Threshold for the foil layer (0-255)
+        edge_size: Spot UV edge filter size (see generate_spot_uv)
+        
+    Returns:
+        Tuple of (white_layer, foil_layer, spot_layer) PIL Images (mode "L")
+    """
+    g = _as_array(gray)
+    white_layer = generate_mask(g, white_threshold)
+    foil_layer = generate_mask(g, foil_threshold)
+    spot_layer = generate_spot_uv(g, edge_size)
+    return white_layer, foil_layer, spot_layer
 
+
+def save_layers(layers: list, max_workers: int = 4):
+    """
+    Save several layer images concurrently.
+    
+    PNG encoding releases the GIL inside zlib, so a small thread pool
+    overlaps the encodes of independent layers.
+    
+    Args:
+        layers: List of (image, path, save_kwargs) tuples
+        max_workers: Maximum number of concurrent saves
+    """
+    def save(layer):
+        image, path, save_kwargs = layer
+        image.save(path, **save_kwargs)
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # list() propagates the first save error, if any
+        list(executor.map(save, layers))